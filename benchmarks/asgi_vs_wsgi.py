@@ -0,0 +1,99 @@
+"""
+Side-by-side benchmark of the WSGI app (gunicorn, sync workers) and the ASGI app
+(uvicorn + async SQLAlchemy over aiosqlite) at high concurrency. Run it from the
+project root:
+
+    $ python benchmarks/asgi_vs_wsgi.py --requests 5000 --concurrency 200
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from loadtest import ROOT, SRC, fetch, process_tree_rss, seed, wait_until_up
+
+SERVERS = {
+    "wsgi": lambda port, workers: [
+        "gunicorn",
+        "wsgi",
+        "--chdir",
+        SRC,
+        "--workers",
+        str(workers),
+        "--bind",
+        "127.0.0.1:{}".format(port),
+    ],
+    "asgi": lambda port, workers: [
+        "uvicorn",
+        "asgi:application",
+        "--app-dir",
+        SRC,
+        "--workers",
+        str(workers),
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+    ],
+}
+
+
+def seed_favorites(env):
+    script = (
+        "from app import create_app\n"
+        "app = create_app(migrations=False)\n"
+        "from models import db, User, Favorite\n"
+        "with app.app_context():\n"
+        "    db.session.add(User(user_name='luke', email='luke@example.com', password='x', is_active=True))\n"
+        "    db.session.flush()\n"
+        "    for i in range(1, 21):\n"
+        "        db.session.add(Favorite(user_id=1, planet_id=i))\n"
+        "        db.session.add(Favorite(user_id=1, character_id=i))\n"
+        "    db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=SRC, env=env, check=True)
+
+
+def run_server(name, args, env):
+    server = subprocess.Popen(SERVERS[name](args.port, args.workers), env=env, cwd=ROOT)
+    try:
+        base = "http://127.0.0.1:{}".format(args.port)
+        wait_until_up(base + "/planet")
+        urls = [base + "/favorites/user/1"] * args.requests
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            statuses = list(pool.map(fetch, urls))
+        elapsed = time.time() - start
+        return {
+            "server": name,
+            "rps": args.requests / elapsed,
+            "errors": len([status for status in statuses if status != 200]),
+            "rss_mb": process_tree_rss(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=3100)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:////tmp/loadtest.db")
+    seed(env)
+    seed_favorites(env)
+
+    print("{:<8} {:>10} {:>8} {:>10}".format("server", "req/s", "errors", "RSS (MB)"))
+    for name in SERVERS:
+        result = run_server(name, args, env)
+        print("{server:<8} {rps:>10.1f} {errors:>8} {rss_mb:>10.1f}".format(**result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cold start report: how long a fresh process takes to import the WSGI app and serve
+its first API request, and which imports dominate that time. Run it from the
+project root:
+
+    $ python benchmarks/cold_start.py --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+from loadtest import SRC, seed
+
+FIRST_REQUEST = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "from wsgi import application\n"
+    "imported = time.perf_counter()\n"
+    "application.test_client().get('/planet')\n"
+    "served = time.perf_counter()\n"
+    "application.test_client().get('/admin/')\n"
+    "admin = time.perf_counter()\n"
+    "print(imported - start, served - start, admin - served)\n"
+)
+
+
+def import_profile(env, top):
+    # python -X importtime writes one line per module to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import wsgi"],
+        cwd=SRC,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:////tmp/loadtest.db")
+    seed(env)
+
+    print("{:>12} {:>10}  {}".format("cumulative", "self", "module (us)"))
+    for cumulative_us, self_us, module in import_profile(env, args.top):
+        print("{:>12} {:>10}  {}".format(cumulative_us, self_us, module))
+
+    timings = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", FIRST_REQUEST],
+            cwd=SRC,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        timings.append([float(value) for value in output.split()])
+    imported, served, admin = [sorted(column)[len(column) // 2] for column in zip(*timings)]
+    print()
+    print("median of {} runs".format(args.runs))
+    print("import wsgi:          {:.0f} ms".format(imported * 1000))
+    print("first API request:    {:.0f} ms".format(served * 1000))
+    print("first /admin request: {:.0f} ms (paid only when the admin is used)".format(admin * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Load test comparing gunicorn with its defaults against the production profile
+in src/gunicorn.conf.py. Run it from the project root:
+
+    $ python benchmarks/loadtest.py --requests 2000 --concurrency 32
+
+It uses a throwaway sqlite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+PROFILES = {
+    "defaults": ["gunicorn", "wsgi", "--chdir", SRC],
+    "production": [
+        "gunicorn",
+        "wsgi",
+        "--chdir",
+        SRC,
+        "--config",
+        os.path.join(SRC, "gunicorn.conf.py"),
+    ],
+}
+
+
+def seed(env):
+    script = (
+        "from app import create_app\n"
+        "app = create_app(migrations=False)\n"
+        "from models import db, Planet, Character\n"
+        "with app.app_context():\n"
+        "    db.drop_all()\n"
+        "    db.create_all()\n"
+        "    for i in range(50):\n"
+        "        planet = Planet(name='planet {}'.format(i), is_active=True)\n"
+        "        db.session.add(planet)\n"
+        "        db.session.flush()\n"
+        "        db.session.add(Character(name='character {}'.format(i), homeworld_id=planet.id, is_active=True))\n"
+        "    db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=SRC, env=env, check=True)
+
+
+def process_tree_rss(pid):
+    # sum the resident memory of the master and its workers, in MB
+    pids = [pid]
+    children = subprocess.run(
+        ["pgrep", "-P", str(pid)], capture_output=True, text=True
+    ).stdout.split()
+    pids += [int(child) for child in children]
+    total = 0
+    for item in pids:
+        try:
+            with open("/proc/{}/status".format(item)) as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return total / 1024
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start on {}".format(url))
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+            return response.status
+    except OSError as error:
+        return getattr(error, "code", None)
+
+
+def run_profile(name, args, env):
+    port = str(args.port)
+    command = PROFILES[name] + ["--bind", "127.0.0.1:" + port]
+    if name == "defaults":
+        command += ["--workers", str(args.workers)]
+    profile_env = dict(env, WEB_CONCURRENCY=str(args.workers))
+    if name == "production":
+        profile_env["APP_MODE"] = "production"
+    server = subprocess.Popen(command, env=profile_env, cwd=ROOT)
+    try:
+        base = "http://127.0.0.1:{}".format(port)
+        wait_until_up(base + "/planet")
+        urls = [
+            base + ("/planet" if i % 2 else "/character") for i in range(args.requests)
+        ]
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            statuses = list(pool.map(fetch, urls))
+        elapsed = time.time() - start
+        errors = len([status for status in statuses if status != 200])
+        return {
+            "profile": name,
+            "rps": args.requests / elapsed,
+            "errors": errors,
+            "rss_mb": process_tree_rss(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=3100)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:////tmp/loadtest.db")
+    seed(env)
+
+    print("{:<12} {:>10} {:>8} {:>10}".format("profile", "req/s", "errors", "RSS (MB)"))
+    for name in PROFILES:
+        result = run_profile(name, args, env)
+        print(
+            "{profile:<12} {rps:>10.1f} {errors:>8} {rss_mb:>10.1f}".format(**result)
+        )
+
+
+if __name__ == "__main__":
+    main()
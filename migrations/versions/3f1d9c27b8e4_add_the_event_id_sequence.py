@@ -0,0 +1,27 @@
+"""add the event id sequence
+
+Revision ID: 3f1d9c27b8e4
+Revises: 6724b63ca3bd
+Create Date: 2026-10-19 18:20:11.402518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1d9c27b8e4'
+down_revision = '6724b63ca3bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ids of the /events notifications, only used with Postgres (see events.py)
+    if op.get_context().dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(sa.Sequence('api_event_id_seq')))
+
+
+def downgrade():
+    if op.get_context().dialect.supports_sequences:
+        op.execute(sa.schema.DropSequence(sa.Sequence('api_event_id_seq')))
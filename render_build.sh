@@ -8,4 +8,6 @@ set -o errexit
 
 pipenv install
 
-pipenv run upgrade
\ No newline at end of file
+pipenv run upgrade
+# the film documents (film_aggregate) of the existing films
+pipenv run rebuild-films
@@ -1,5 +1,6 @@
 import os
-from flask_admin import Admin
+import threading
+from flask import Flask
 from models import (
     db,
     User,
@@ -11,24 +12,73 @@ from models import (
     Film,
     Favorite,
 )
-from flask_admin.contrib.sqla import ModelView
 
 
 def setup_admin(app):
+    # flask-admin is heavy to import, it is only loaded when the admin is used
+    from flask_admin import Admin
+    from admin_views import (
+        UserView,
+        PlanetView,
+        CharacterView,
+        StarshipView,
+        VehicleView,
+        FilmView,
+        FilmDataView,
+        FavoriteView,
+    )
+
     app.secret_key = os.environ.get("FLASK_APP_KEY", "sample key")
     app.config["FLASK_ADMIN_SWATCH"] = "cerulean"
     admin = Admin(app, name="4Geeks Admin", template_mode="bootstrap3")
 
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Planet, db.session))
-    admin.add_view(ModelView(Character, db.session))
-    admin.add_view(ModelView(Starship, db.session))
-    admin.add_view(ModelView(Vehicle, db.session))
-    admin.add_view(ModelView(Film, db.session))
-    admin.add_view(ModelView(FilmData, db.session))
-    admin.add_view(ModelView(Favorite, db.session))
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(PlanetView(Planet, db.session))
+    admin.add_view(CharacterView(Character, db.session))
+    admin.add_view(StarshipView(Starship, db.session))
+    admin.add_view(VehicleView(Vehicle, db.session))
+    admin.add_view(FilmView(Film, db.session))
+    admin.add_view(FilmDataView(FilmData, db.session))
+    admin.add_view(FavoriteView(Favorite, db.session))
 
 
-# You can duplicate that line to add mew models
+# You can duplicate that line to add mew models, see admin_views.py for the view classes
 # admin.add_view(ModelView(YourModelName, db.session))
+
+
+class LazyAdmin:
+    """
+    WSGI middleware that sends /admin requests to a separate Flask app which is
+    only built (and flask-admin only imported) on the first of those requests.
+    Flask does not allow adding views to an app once it has served a request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.admin_app = None
+        self.lock = threading.Lock()
+
+    def get_admin_app(self):
+        with self.lock:
+            if self.admin_app is None:
+                admin_app = Flask(__name__)
+                admin_app.config.update(self.app.config)
+                db.init_app(admin_app)
+                # share the main app's engines (and connection pool), a second pool
+                # per worker would double the connections the database sees.
+                # The engines init_app just created have not connected yet.
+                with self.app.app_context():
+                    engines = dict(db.engines)
+                with admin_app.app_context():
+                    db.engines.update(engines)
+                setup_admin(admin_app)
+                self.admin_app = admin_app
+        return self.admin_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path == "/admin" or path.startswith("/admin/"):
+            return self.get_admin_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
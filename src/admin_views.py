@@ -0,0 +1,170 @@
+"""
+Flask-Admin views that stay usable on big tables: estimated row counts, eager-loaded
+relationships and only index-backed search, filters and sorting.
+This module is imported by admin.setup_admin, so flask-admin is still loaded lazily.
+"""
+from flask_admin.contrib.sqla import ModelView, tools
+from flask_admin.contrib.sqla.filters import IntEqualFilter
+from sqlalchemy import or_, text
+from sqlalchemy.orm import joinedload
+from models import db, Character, Starship, Vehicle, Film, FilmData, Favorite
+
+# below this amount of rows an exact COUNT(*) is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def get_estimated_count(table_name):
+    # planner statistics instead of a full scan, None when the database has none
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        count = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table_name},
+        ).scalar()
+    elif dialect == "mysql":
+        count = db.session.execute(
+            text(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = :table"
+            ),
+            {"table": table_name},
+        ).scalar()
+    else:
+        count = None
+    if count is None or count < 0:
+        return None
+    return int(count)
+
+
+class ScalableModelView(ModelView):
+    can_set_page_size = False
+    page_size = 20
+    column_default_sort = "id"
+    # column_searchable_list and column_filters must only name indexed columns,
+    # search terms are matched exactly so the index can be used
+    column_searchable_list = ()
+
+    # the admin also shows the soft-deleted rows
+    def get_query(self):
+        return super().get_query().execution_options(include_inactive=True)
+
+    def get_count_query(self):
+        return super().get_count_query().execution_options(include_inactive=True)
+
+    def get_one(self, id):
+        return self.session.get(
+            self.model,
+            tools.iterdecode(id),
+            execution_options={"include_inactive": True},
+        )
+
+    def get_list(
+        self,
+        page,
+        sort_column,
+        sort_desc,
+        search,
+        filters,
+        execute=True,
+        page_size=None,
+    ):
+        if search or filters:
+            return super().get_list(
+                page, sort_column, sort_desc, search, filters, execute, page_size
+            )
+        count = get_estimated_count(self.model.__tablename__)
+        if count is None or count < ESTIMATED_COUNT_THRESHOLD:
+            return super().get_list(
+                page, sort_column, sort_desc, search, filters, execute, page_size
+            )
+
+        # same as ModelView.get_list without the COUNT(*) query
+        query = self.get_query()
+        for join in self._auto_joins:
+            query = query.options(joinedload(join))
+        query, joins = self._apply_sorting(query, {}, sort_column, sort_desc)
+        query = self._apply_pagination(query, page, page_size)
+        if execute:
+            query = query.all()
+        return count, query
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        # flask-admin casts the columns and uses ILIKE '%term%', which can't use an index.
+        # The whole search text is compared, "Luke Skywalker" finds "Luke Skywalker"
+        search = search.strip()
+        if not search:
+            return query, count_query, joins, count_joins
+        filter_stmt = or_(*[field == search for field, path in self._search_fields])
+        query = query.filter(filter_stmt)
+        if count_query is not None:
+            count_query = count_query.filter(filter_stmt)
+        return query, count_query, joins, count_joins
+
+
+class UserView(ScalableModelView):
+    column_list = ("id", "user_name", "email", "is_active")
+    column_sortable_list = ("id", "user_name", "email")
+    column_searchable_list = ("user_name", "email")
+
+
+class PlanetView(ScalableModelView):
+    column_list = ("id", "name", "population", "terrain", "climate", "is_active")
+    column_sortable_list = ("id", "name")
+    column_searchable_list = ("name",)
+
+
+class CharacterView(ScalableModelView):
+    column_list = ("id", "name", "birth_year", "homeworld", "is_active")
+    column_sortable_list = ("id", "name")
+    column_searchable_list = ("name",)
+    column_filters = (IntEqualFilter(Character.homeworld_id, "Homeworld id"),)
+    column_select_related_list = (Character.homeworld,)
+
+
+class StarshipView(ScalableModelView):
+    column_list = ("id", "name", "model", "starship_type", "pilot", "is_active")
+    column_sortable_list = ("id", "name")
+    column_searchable_list = ("name",)
+    column_select_related_list = (Starship.pilot,)
+
+
+class VehicleView(ScalableModelView):
+    column_list = ("id", "name", "model", "vehicle_type", "pilot", "is_active")
+    column_sortable_list = ("id", "name")
+    column_searchable_list = ("name",)
+    column_select_related_list = (Vehicle.pilot,)
+
+
+class FilmView(ScalableModelView):
+    column_list = ("id", "title", "film_data", "is_active")
+    column_sortable_list = ("id",)
+    column_select_related_list = (Film.film_data,)
+
+
+class FilmDataView(ScalableModelView):
+    column_list = ("id", "character", "planet", "starship", "vehicle")
+    column_sortable_list = ("id",)
+    column_select_related_list = (
+        FilmData.character,
+        FilmData.planet,
+        FilmData.starship,
+        FilmData.vehicle,
+    )
+
+
+class FavoriteView(ScalableModelView):
+    column_list = ("id", "user", "character", "planet", "starship", "vehicle", "film")
+    column_sortable_list = ("id",)
+    column_filters = (
+        IntEqualFilter(Favorite.user_id, "User id"),
+        IntEqualFilter(Favorite.character_id, "Character id"),
+        IntEqualFilter(Favorite.planet_id, "Planet id"),
+    )
+    column_select_related_list = (
+        Favorite.user,
+        Favorite.character,
+        Favorite.planet,
+        Favorite.starship,
+        Favorite.vehicle,
+        Favorite.film,
+    )
@@ -0,0 +1,147 @@
+"""
+Precomputed film documents (FilmAggregate) so reading a film is a single lookup.
+Any flush that touches a film, its film data, or a character, planet, starship or
+vehicle it references marks the affected films, and they are rebuilt right before
+the commit, in the same transaction.
+The listeners are registered on every SQLAlchemy session, so the admin and the
+ASGI app keep the documents up to date too.
+"""
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, selectinload
+from models import (
+    db,
+    Planet,
+    Character,
+    Starship,
+    Vehicle,
+    FilmData,
+    Film,
+    FilmAggregate,
+)
+
+TRACKED_MODELS = (Planet, Character, Starship, Vehicle, FilmData, Film)
+
+# everything Film.serialize() touches, loaded in a few queries instead of row by row
+FILM_LOADER_OPTIONS = [
+    selectinload(Film.film_data).selectinload(FilmData.planet),
+    selectinload(Film.film_data)
+    .selectinload(FilmData.character)
+    .selectinload(Character.homeworld),
+    selectinload(Film.film_data)
+    .selectinload(FilmData.starship)
+    .selectinload(Starship.pilot)
+    .selectinload(Character.homeworld),
+    selectinload(Film.film_data)
+    .selectinload(FilmData.vehicle)
+    .selectinload(Vehicle.pilot)
+    .selectinload(Character.homeworld),
+]
+
+
+def find_affected_films(session, changed):
+    # inactive rows still show up in the documents of the films that reference them
+    include_inactive = {"include_inactive": True}
+    planet_ids = changed[Planet]
+    character_ids = set(changed[Character])
+    starship_ids = set(changed[Starship])
+    vehicle_ids = set(changed[Vehicle])
+
+    # follow the references up: planet -> character -> starship/vehicle -> film data
+    if planet_ids:
+        character_ids.update(
+            session.scalars(
+                db.select(Character.id)
+                .where(Character.homeworld_id.in_(planet_ids))
+                .execution_options(**include_inactive)
+            )
+        )
+    if character_ids:
+        starship_ids.update(
+            session.scalars(
+                db.select(Starship.id)
+                .where(Starship.pilot_id.in_(character_ids))
+                .execution_options(**include_inactive)
+            )
+        )
+        vehicle_ids.update(
+            session.scalars(
+                db.select(Vehicle.id)
+                .where(Vehicle.pilot_id.in_(character_ids))
+                .execution_options(**include_inactive)
+            )
+        )
+    film_data_ids = set(changed[FilmData])
+    conditions = [
+        FilmData.planet_id.in_(planet_ids),
+        FilmData.character_id.in_(character_ids),
+        FilmData.starship_id.in_(starship_ids),
+        FilmData.vehicle_id.in_(vehicle_ids),
+    ]
+    film_data_ids.update(
+        session.scalars(db.select(FilmData.id).where(or_(*conditions)))
+    )
+
+    film_ids = set(changed[Film])
+    if film_data_ids:
+        film_ids.update(
+            session.scalars(
+                db.select(Film.id)
+                .where(Film.film_data_id.in_(film_data_ids))
+                .execution_options(**include_inactive)
+            )
+        )
+    return film_ids
+
+
+def refresh_film_aggregates(session, film_ids=None):
+    # film_ids=None rebuilds every film, with SOFT_DELETE=true the inactive films
+    # are not loaded and so lose their document
+    query = db.select(Film).options(*FILM_LOADER_OPTIONS)
+    if film_ids is not None:
+        query = query.where(Film.id.in_(film_ids))
+    films = session.scalars(query).all()
+    for film in films:
+        aggregate = session.get(FilmAggregate, film.id)
+        if aggregate is None:
+            aggregate = FilmAggregate(film_id=film.id)
+            session.add(aggregate)
+        aggregate.document = film.serialize()
+    # films deleted (or made inactive) lose their document
+    found_ids = set(film.id for film in films)
+    if film_ids is None:
+        session.execute(
+            db.delete(FilmAggregate).where(FilmAggregate.film_id.not_in(found_ids))
+        )
+    elif film_ids - found_ids:
+        session.execute(
+            db.delete(FilmAggregate).where(
+                FilmAggregate.film_id.in_(film_ids - found_ids)
+            )
+        )
+    session.flush()
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changes(session, flush_context):
+    changed = session.info.setdefault(
+        "film_changes", dict((model, set()) for model in TRACKED_MODELS)
+    )
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        for model in TRACKED_MODELS:
+            if isinstance(instance, model):
+                changed[model].add(instance.id)
+
+
+@event.listens_for(Session, "before_commit")
+def refresh_changed_films(session):
+    session.flush()
+    changed = session.info.pop("film_changes", None)
+    if not changed or not any(changed.values()):
+        return
+    refresh_film_aggregates(session, find_affected_films(session, changed))
+    session.info.pop("film_changes", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changes(session):
+    session.info.pop("film_changes", None)
@@ -2,44 +2,91 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import click
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, Planet, Character, Favorite
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from utils import (
+    APIException,
+    generate_sitemap,
+    get_database_url,
+    get_engine_options,
+    is_retryable_error,
+)
+from admin import LazyAdmin
+from events import broker, publish_event, stream_events, uses_notify
+from aggregates import refresh_film_aggregates
+from soft_delete import delete_item, purge_inactive, set_active
+from models import (
+    db,
+    User,
+    Planet,
+    Character,
+    Favorite,
+    Film,
+    FilmAggregate,
+    FAVORITE_COUNTED,
+    change_favorite_count,
+    recompute_favorite_counts,
+)
 
 # from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+api = Blueprint("api", __name__, cli_group=None)
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config["SQLALCHEMY_DATABASE_URI"] = db_url.replace(
-        "postgres://", "postgresql://"
-    )
-else:
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:////tmp/test.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+def create_app(migrations=True):
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = get_database_url()
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = get_engine_options()
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # flask-migrate (and alembic) is only needed by the `flask db` commands
+    if migrations:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+    db.init_app(app)
+    CORS(app)
+    app.register_blueprint(api)
+    # the admin is built on the first request to /admin
+    app.wsgi_app = LazyAdmin(app)
+    return app
 
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 
+# a name, user_name or email already used by another active row
+@api.app_errorhandler(IntegrityError)
+def handle_integrity_error(error):
+    db.session.rollback()
+    return jsonify({"msg": "It conflicts with an existing resource"}), 409
+
+
+# two writes waited on each other's locks and Postgres cancelled this one,
+# any other database error is still a 500
+@api.app_errorhandler(DBAPIError)
+def handle_database_error(error):
+    if not is_retryable_error(error):
+        raise error
+    db.session.rollback()
+    return (
+        jsonify({"msg": "The resource is busy, try again"}),
+        503,
+        {"Retry-After": "1"},
+    )
+
+
 # generate sitemap with all your endpoints
-@app.route("/")
+@api.route("/")
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
 
 
 """         Status codes
@@ -52,25 +99,25 @@ def sitemap():
 """
 
 """
-En caso de quererse reemplazar los DELETE por un PUT y actualizar el estado de 'is_active' a false
+Con SOFT_DELETE=true los DELETE actualizan el estado de 'is_active' a false en vez de borrar (ver soft_delete.py)
 """
 
 
-@app.route("/user", methods=["GET"])
+@api.route("/user", methods=["GET"])
 def get_users():
     users = User.query.all()
     serialized_users = list(map(lambda item: item.serialize(), users))
     return jsonify({"msg": "ok", "results": serialized_users}), 200
 
 
-@app.route("/user/<int:user_id>", methods=["GET"])
+@api.route("/user/<int:user_id>", methods=["GET"])
 def get_single_user(user_id):
     user = User.query.get(user_id)
     serialized_user = user.serialize()
     return jsonify({"msg": "ok", "result": serialized_user}), 200
 
 
-@app.route("/user/", methods=["POST"])
+@api.route("/user/", methods=["POST"])
 def create_user():
     body = request.get_json(silent=True)
     if body is None:
@@ -89,11 +136,13 @@ def create_user():
     new_user.password = body["password"]
     new_user.is_active = body["is_active"]
     db.session.add(new_user)
+    db.session.flush()
+    publish_event("user", "created", new_user.id, new_user.id)
     db.session.commit()
     return jsonify({"msg": "Added successfully"}), 201
 
 
-@app.route("/user/<int:user_id>", methods=["PUT"])
+@api.route("/user/<int:user_id>", methods=["PUT"])
 def update_single_user(user_id):
     body = request.get_json(silent=True)
     if body is None:
@@ -106,40 +155,47 @@ def update_single_user(user_id):
         return jsonify({"msg": "password parameter is required"}), 400
     if "is_active" not in body:
         return jsonify({"msg": "is_active parameter is required"}), 400
-    user = User.query.get(user_id)
+    # inactive rows too, a PUT can undo a soft delete
+    user = db.session.get(
+        User, user_id, execution_options={"include_inactive": True}
+    )
+    if user is None:
+        return jsonify({"msg": "User not found"}), 404
     user.user_name = body["user_name"]
     user.email = body["email"]
     user.password = body["password"]
-    user.is_active = body["is_active"]
+    set_active(user, body["is_active"])
+    publish_event("user", "updated", user_id, user_id)
     db.session.commit()
     return jsonify({"msg": "Updated successfully"}), 200
 
 
-@app.route("/user/<int:user_id>", methods=["DELETE"])
+@api.route("/user/<int:user_id>", methods=["DELETE"])
 def delete_single_user(user_id):
     user = User.query.get(user_id)
     if user is None:
         return jsonify({"msg": "User not found"}), 404
-    db.session.delete(user)
+    delete_item(user)
+    publish_event("user", "deleted", user_id, user_id)
     db.session.commit()
     return jsonify({"msg": "User deleted successfully"}), 200
 
 
-@app.route("/planet", methods=["GET"])
+@api.route("/planet", methods=["GET"])
 def get_planets():
     planets = Planet.query.all()
     serialized_planets = list(map(lambda item: item.serialize(), planets))
     return jsonify({"msg": "ok", "results": serialized_planets}), 200
 
 
-@app.route("/planet/<int:planet_id>", methods=["GET"])
+@api.route("/planet/<int:planet_id>", methods=["GET"])
 def get_single_planet(planet_id):
     planet = Planet.query.get(planet_id)
     serialized_planet = planet.serialize()
     return jsonify({"msg": "ok", "result": serialized_planet}), 200
 
 
-@app.route("/planet/", methods=["POST"])
+@api.route("/planet/", methods=["POST"])
 def create_planet():
     body = request.get_json(silent=True)
     if body is None:
@@ -152,11 +208,13 @@ def create_planet():
     new_planet.name = body["name"]
     new_planet.is_active = body["is_active"]
     db.session.add(new_planet)
+    db.session.flush()
+    publish_event("planet", "created", new_planet.id)
     db.session.commit()
     return jsonify({"msg": "Added successfully"}), 201
 
 
-@app.route("/planet/<int:planet_id>", methods=["PUT"])
+@api.route("/planet/<int:planet_id>", methods=["PUT"])
 def update_single_planet(planet_id):
     body = request.get_json(silent=True)
     if body is None:
@@ -165,38 +223,45 @@ def update_single_planet(planet_id):
         return jsonify({"msg": "name parameter is required"}), 400
     if "is_active" not in body:
         return jsonify({"msg": "is_active parameter is required"}), 400
-    planet = Planet.query.get(planet_id)
+    # inactive rows too, a PUT can undo a soft delete
+    planet = db.session.get(
+        Planet, planet_id, execution_options={"include_inactive": True}
+    )
+    if planet is None:
+        return jsonify({"msg": "Planet not found"}), 404
     planet.name = body["name"]
-    planet.is_active = body["is_active"]
+    set_active(planet, body["is_active"])
+    publish_event("planet", "updated", planet_id)
     db.session.commit()
     return jsonify({"msg": "Updated successfully"}), 200
 
 
-@app.route("/planet/<int:planet_id>", methods=["DELETE"])
+@api.route("/planet/<int:planet_id>", methods=["DELETE"])
 def delete_single_planet(planet_id):
     planet = Planet.query.get(planet_id)
     if planet is None:
         return jsonify({"msg": "Planet not found"}), 404
-    db.session.delete(planet)
+    delete_item(planet)
+    publish_event("planet", "deleted", planet_id)
     db.session.commit()
     return jsonify({"msg": "Planet deleted successfully"}), 200
 
 
-@app.route("/character/", methods=["GET"])
+@api.route("/character/", methods=["GET"])
 def get_characters():
     characters = Character.query.all()
     serialized_characters = list(map(lambda item: item.serialize(), characters))
     return jsonify({"msg": "ok", "results": serialized_characters}), 200
 
 
-@app.route("/character/<int:character_id>", methods=["GET"])
+@api.route("/character/<int:character_id>", methods=["GET"])
 def get_single_character(character_id):
     character = Character.query.get(character_id)
     serialized_character = character.serialize()
     return jsonify({"msg": "ok", "result": serialized_character}), 200
 
 
-@app.route("/character/", methods=["POST"])
+@api.route("/character/", methods=["POST"])
 def create_character():
     body = request.get_json(silent=True)
     if body is None:
@@ -212,11 +277,13 @@ def create_character():
     new_character.homeworld_id = body["homeworld_id"]
     new_character.is_active = body["is_active"]
     db.session.add(new_character)
+    db.session.flush()
+    publish_event("character", "created", new_character.id)
     db.session.commit()
     return jsonify({"msg": "Added successfully"}), 201
 
 
-@app.route("/character/<int:character_id>", methods=["PUT"])
+@api.route("/character/<int:character_id>", methods=["PUT"])
 def update_single_character(character_id):
     body = request.get_json(silent=True)
     if body is None:
@@ -227,25 +294,32 @@ def update_single_character(character_id):
         return jsonify({"msg": "homeworld parameter is required"}), 400
     if "is_active" not in body:
         return jsonify({"msg": "is_active parameter is required"}), 400
-    character = Character.query.get(character_id)
+    # inactive rows too, a PUT can undo a soft delete
+    character = db.session.get(
+        Character, character_id, execution_options={"include_inactive": True}
+    )
+    if character is None:
+        return jsonify({"msg": "Character not found"}), 404
     character.name = body["name"]
     character.homeworld_id = body["homeworld_id"]
-    character.is_active = body["is_active"]
+    set_active(character, body["is_active"])
+    publish_event("character", "updated", character_id)
     db.session.commit()
     return jsonify({"msg": "Updated successfully"}), 200
 
 
-@app.route("/character/<int:character_id>", methods=["DELETE"])
+@api.route("/character/<int:character_id>", methods=["DELETE"])
 def delete_single_character(character_id):
     character = Character.query.get(character_id)
     if character is None:
         return jsonify({"msg": "Character not found"}), 404
-    db.session.delete(character)
+    delete_item(character)
+    publish_event("character", "deleted", character_id)
     db.session.commit()
     return jsonify({"msg": "Character deleted successfully"}), 200
 
 
-@app.route("/favorites/user/<int:user_id>", methods=["GET"])
+@api.route("/favorites/user/<int:user_id>", methods=["GET"])
 def get_favorites(user_id):
     user = User.query.get(user_id)
     if user is None:
@@ -287,7 +361,7 @@ def get_favorites(user_id):
     )
 
 
-@app.route("/favorite/user/<int:user_id>/planet/<int:planet_id>", methods=["POST"])
+@api.route("/favorite/user/<int:user_id>/planet/<int:planet_id>", methods=["POST"])
 def add_favorite_planet(user_id, planet_id):
     user = User.query.get(user_id)
     planet = Planet.query.get(planet_id)
@@ -314,12 +388,15 @@ def add_favorite_planet(user_id, planet_id):
 
     new_favorite = Favorite(user_id=user_id, planet_id=planet_id)
     db.session.add(new_favorite)
+    change_favorite_count(Planet, planet_id, 1)
+    db.session.flush()
+    publish_event("favorite", "created", new_favorite.id, user_id)
     db.session.commit()
 
     return jsonify({"msg": "Favorite planet added successfully"}), 201
 
 
-@app.route("/favorite/user/<int:user_id>/planet/<int:planet_id>", methods=["DELETE"])
+@api.route("/favorite/user/<int:user_id>/planet/<int:planet_id>", methods=["DELETE"])
 def delete_favorite_planet(user_id, planet_id):
     favorite = (
         db.session.query(Favorite)
@@ -331,11 +408,13 @@ def delete_favorite_planet(user_id, planet_id):
         return jsonify({"msg": "Favorite planet not found"}), 404
 
     db.session.delete(favorite)
+    change_favorite_count(Planet, planet_id, -1)
+    publish_event("favorite", "deleted", favorite.id, user_id)
     db.session.commit()
     return jsonify({"msg": "Favorite planet deleted successfully"}), 200
 
 
-@app.route(
+@api.route(
     "/favorite/user/<int:user_id>/character/<int:character_id>", methods=["POST"]
 )
 def add_favorite_character(user_id, character_id):
@@ -366,12 +445,15 @@ def add_favorite_character(user_id, character_id):
 
     new_favorite = Favorite(user_id=user_id, character_id=character_id)
     db.session.add(new_favorite)
+    change_favorite_count(Character, character_id, 1)
+    db.session.flush()
+    publish_event("favorite", "created", new_favorite.id, user_id)
     db.session.commit()
 
     return jsonify({"msg": "Favorite character added successfully"}), 201
 
 
-@app.route(
+@api.route(
     "/favorite/user/<int:user_id>/character/<int:character_id>", methods=["DELETE"]
 )
 def delete_favorite_character(user_id, character_id):
@@ -385,11 +467,130 @@ def delete_favorite_character(user_id, character_id):
         return jsonify({"msg": "Favorite character not found"}), 404
 
     db.session.delete(favorite)
+    change_favorite_count(Character, character_id, -1)
+    publish_event("favorite", "deleted", favorite.id, user_id)
     db.session.commit()
     return jsonify({"msg": "Favorite character deleted successfully"}), 200
 
 
+@api.route("/film", methods=["GET"])
+def get_films():
+    # precomputed documents, see aggregates.py
+    aggregates = FilmAggregate.query.order_by(FilmAggregate.film_id).all()
+    serialized_films = list(map(lambda item: item.serialize(), aggregates))
+    return jsonify({"msg": "ok", "results": serialized_films}), 200
+
+
+@api.route("/film/<int:film_id>", methods=["GET"])
+def get_single_film(film_id):
+    aggregate = FilmAggregate.query.get(film_id)
+    if aggregate is None:
+        return jsonify({"msg": "Film not found"}), 404
+    return jsonify({"msg": "ok", "result": aggregate.serialize()}), 200
+
+
+@api.route("/leaderboard/<string:favorite_type>", methods=["GET"])
+def get_leaderboard(favorite_type):
+    if favorite_type not in FAVORITE_COUNTED:
+        return (
+            jsonify({"msg": "The type {} doesn't exist".format(favorite_type)}),
+            404,
+        )
+    limit = request.args.get("limit", 10, type=int)
+    if limit < 1 or limit > 100:
+        return jsonify({"msg": "limit must be between 1 and 100"}), 400
+    model = FAVORITE_COUNTED[favorite_type][0]
+    # served from the index on favorite_count, no GROUP BY over favorite
+    if model is Film:
+        # films come from their precomputed documents, see aggregates.py
+        films = (
+            db.session.query(FilmAggregate.document, Film.favorite_count)
+            .join(Film, Film.id == FilmAggregate.film_id)
+            .filter(Film.favorite_count > 0)
+            .order_by(Film.favorite_count.desc(), Film.id)
+            .limit(limit)
+            .all()
+        )
+        serialized_films = list(
+            map(
+                lambda item: dict(item.document, favorite_count=item.favorite_count),
+                films,
+            )
+        )
+        return jsonify({"msg": "ok", "results": serialized_films}), 200
+    items = (
+        model.query.filter(model.favorite_count > 0)
+        .order_by(model.favorite_count.desc(), model.id)
+        .limit(limit)
+        .all()
+    )
+    serialized_items = list(
+        map(
+            lambda item: dict(item.serialize(), favorite_count=item.favorite_count),
+            items,
+        )
+    )
+    return jsonify({"msg": "ok", "results": serialized_items}), 200
+
+
+@api.route("/events", methods=["GET"])
+def get_events():
+    types = request.args.get("types")
+    types = set(types.split(",")) if types else None
+    user_id = request.args.get("user_id", type=int)
+    # EventSource sends the Last-Event-ID header when it reconnects
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get("last_event_id", type=int)
+    # without a working LISTEN connection the stream would never get an event
+    if uses_notify() and not broker.start_listener(db.engine):
+        return (
+            jsonify({"msg": "The event stream is not available, try again later"}),
+            503,
+            {"Retry-After": "5"},
+        )
+    subscription, missed = broker.subscribe(types, user_id, last_event_id)
+    if subscription is None:
+        return (
+            jsonify({"msg": "Too many open event streams, try again later"}),
+            503,
+            {"Retry-After": "5"},
+        )
+    # the stream doesn't use the database, no connection is held while it is open
+    return Response(
+        stream_events(subscription, missed),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# `flask repair-favorite-counts` recomputes the counters if they ever drift
+@api.cli.command("repair-favorite-counts")
+def repair_favorite_counts():
+    recompute_favorite_counts()
+    print("Favorite counts recomputed")
+
+
+# `flask rebuild-film-aggregates` rebuilds every film document, drops the stale ones
+@api.cli.command("rebuild-film-aggregates")
+def rebuild_film_aggregates():
+    refresh_film_aggregates(db.session)
+    db.session.commit()
+    print("Film aggregates rebuilt")
+
+
+# `flask purge-inactive` hard-deletes the rows soft-deleted more than --days ago,
+# run it from a cron job
+@api.cli.command("purge-inactive")
+@click.option("--days", default=30, help="Days a row stays inactive before it is purged")
+@click.option("--batch-size", default=500, help="Rows deleted per transaction")
+def purge_inactive_rows(days, batch_size):
+    purged = purge_inactive(days, batch_size)
+    for table_name, count in purged.items():
+        print("{}: {} rows purged".format(table_name, count))
+
+
 # this only runs if `$ python src/app.py` is executed
 if __name__ == "__main__":
     PORT = int(os.environ.get("PORT", 3000))
-    app.run(host="0.0.0.0", port=PORT, debug=False)
+    create_app().run(host="0.0.0.0", port=PORT, debug=False)
@@ -0,0 +1,654 @@
+"""
+ASGI version of the API Server: the same endpoints and JSON responses as app.py,
+served with Starlette on top of an async SQLAlchemy engine.
+Run it with uvicorn: `uvicorn asgi:application --app-dir ./src/`
+Flask-Admin, the migrations and the /events stream still live in the WSGI app (app.py),
+with Postgres the writes served here reach its subscribers through NOTIFY.
+"""
+import asyncio
+import contextlib
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import HTMLResponse, JSONResponse
+from starlette.routing import Route
+from utils import get_database_url, get_engine_options, is_retryable_error
+from models import (
+    User,
+    Planet,
+    Character,
+    Favorite,
+    Film,
+    FilmAggregate,
+    FAVORITE_COUNTED,
+)
+# importing aggregates registers the listeners that keep FilmAggregate up to date
+import aggregates
+from soft_delete import SOFT_DELETE, deactivate, set_active
+from events import NOTIFY_EVENT, build_event, notify_parameters
+
+
+def get_async_database_url():
+    db_url = get_database_url()
+    if db_url.startswith("postgresql://"):
+        return db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if db_url.startswith("sqlite://"):
+        return db_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return db_url
+
+
+engine = create_async_engine(get_async_database_url(), **get_engine_options())
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def get_body(request):
+    # same behaviour as request.get_json(silent=True) in Flask
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def jsonify(data, status_code):
+    return JSONResponse(data, status_code=status_code)
+
+
+async def change_favorite_count(session, model, item_id, amount):
+    # same as models.change_favorite_count, committed with the Favorite row
+    await session.execute(
+        update(model)
+        .where(model.id == item_id)
+        .values(favorite_count=model.favorite_count + amount)
+    )
+
+
+async def publish_event(session, resource, action, item_id, user_id=None):
+    # same as events.publish_event, the WSGI workers' /events subscribers get the
+    # event through NOTIFY with the commit. Without Postgres there is no way to
+    # reach them, this app serves no /events stream of its own
+    if engine.dialect.name != "postgresql":
+        return
+    event = build_event(resource, action, item_id, user_id)
+    # row locks before the advisory lock, as in events.publish_event
+    await session.flush()
+    await session.execute(NOTIFY_EVENT, notify_parameters(event))
+
+
+async def sitemap(request):
+    links = []
+    for route in request.app.routes:
+        if "GET" in (route.methods or ()) and "{" not in route.path:
+            links.append(route.path)
+    links_html = "".join(["<li><a href='" + y + "'>" + y + "</a></li>" for y in links])
+    return HTMLResponse(
+        "<div><h1>Rigo welcomes you to your API!!</h1><ul>" + links_html + "</ul></div>"
+    )
+
+
+async def get_users(request):
+    async with Session() as session:
+        users = (await session.scalars(select(User))).all()
+    serialized_users = list(map(lambda item: item.serialize(), users))
+    return jsonify({"msg": "ok", "results": serialized_users}, 200)
+
+
+async def get_single_user(request):
+    async with Session() as session:
+        user = await session.get(User, request.path_params["user_id"])
+    if user is None:
+        return jsonify({"msg": "User not found"}, 404)
+    return jsonify({"msg": "ok", "result": user.serialize()}, 200)
+
+
+async def create_user(request):
+    body = await get_body(request)
+    if body is None:
+        return jsonify({"msg": "You must put information in the body"}, 400)
+    if "user_name" not in body:
+        return jsonify({"msg": "user_name parameter is required"}, 400)
+    if "email" not in body:
+        return jsonify({"msg": "email parameter is required"}, 400)
+    if "password" not in body:
+        return jsonify({"msg": "password parameter is required"}, 400)
+    if "is_active" not in body:
+        return jsonify({"msg": "is_active parameter is required"}, 400)
+    async with Session() as session:
+        new_user = User()
+        new_user.user_name = body["user_name"]
+        new_user.email = body["email"]
+        new_user.password = body["password"]
+        new_user.is_active = body["is_active"]
+        session.add(new_user)
+        await session.flush()
+        await publish_event(session, "user", "created", new_user.id, new_user.id)
+        await session.commit()
+    return jsonify({"msg": "Added successfully"}, 201)
+
+
+async def update_single_user(request):
+    body = await get_body(request)
+    if body is None:
+        return jsonify({"msg": "User not found"}, 404)
+    if "user_name" not in body:
+        return jsonify({"msg": "user_name parameter is required"}, 400)
+    if "email" not in body:
+        return jsonify({"msg": "email parameter is required"}, 400)
+    if "password" not in body:
+        return jsonify({"msg": "password parameter is required"}, 400)
+    if "is_active" not in body:
+        return jsonify({"msg": "is_active parameter is required"}, 400)
+    async with Session() as session:
+        # inactive rows too, a PUT can undo a soft delete
+        user = await session.get(
+            User,
+            request.path_params["user_id"],
+            execution_options={"include_inactive": True},
+        )
+        if user is None:
+            return jsonify({"msg": "User not found"}, 404)
+        user.user_name = body["user_name"]
+        user.email = body["email"]
+        user.password = body["password"]
+        set_active(user, body["is_active"])
+        await publish_event(session, "user", "updated", user.id, user.id)
+        await session.commit()
+    return jsonify({"msg": "Updated successfully"}, 200)
+
+
+async def delete_single_user(request):
+    async with Session() as session:
+        user = await session.get(User, request.path_params["user_id"])
+        if user is None:
+            return jsonify({"msg": "User not found"}, 404)
+        if SOFT_DELETE:
+            deactivate(user)
+        else:
+            await session.delete(user)
+        await publish_event(session, "user", "deleted", user.id, user.id)
+        await session.commit()
+    return jsonify({"msg": "User deleted successfully"}, 200)
+
+
+async def get_planets(request):
+    async with Session() as session:
+        planets = (await session.scalars(select(Planet))).all()
+    serialized_planets = list(map(lambda item: item.serialize(), planets))
+    return jsonify({"msg": "ok", "results": serialized_planets}, 200)
+
+
+async def get_single_planet(request):
+    async with Session() as session:
+        planet = await session.get(Planet, request.path_params["planet_id"])
+    if planet is None:
+        return jsonify({"msg": "Planet not found"}, 404)
+    return jsonify({"msg": "ok", "result": planet.serialize()}, 200)
+
+
+async def create_planet(request):
+    body = await get_body(request)
+    if body is None:
+        return jsonify({"msg": "You must put information in the body"}, 400)
+    if "name" not in body:
+        return jsonify({"msg": "name parameter is required"}, 400)
+    if "is_active" not in body:
+        return jsonify({"msg": "is_active parameter is required"}, 400)
+    async with Session() as session:
+        new_planet = Planet()
+        new_planet.name = body["name"]
+        new_planet.is_active = body["is_active"]
+        session.add(new_planet)
+        await session.flush()
+        await publish_event(session, "planet", "created", new_planet.id)
+        await session.commit()
+    return jsonify({"msg": "Added successfully"}, 201)
+
+
+async def update_single_planet(request):
+    body = await get_body(request)
+    if body is None:
+        return jsonify({"msg": "Planet not found"}, 404)
+    if "name" not in body:
+        return jsonify({"msg": "name parameter is required"}, 400)
+    if "is_active" not in body:
+        return jsonify({"msg": "is_active parameter is required"}, 400)
+    async with Session() as session:
+        # inactive rows too, a PUT can undo a soft delete
+        planet = await session.get(
+            Planet,
+            request.path_params["planet_id"],
+            execution_options={"include_inactive": True},
+        )
+        if planet is None:
+            return jsonify({"msg": "Planet not found"}, 404)
+        planet.name = body["name"]
+        set_active(planet, body["is_active"])
+        await publish_event(session, "planet", "updated", planet.id)
+        await session.commit()
+    return jsonify({"msg": "Updated successfully"}, 200)
+
+
+async def delete_single_planet(request):
+    async with Session() as session:
+        planet = await session.get(Planet, request.path_params["planet_id"])
+        if planet is None:
+            return jsonify({"msg": "Planet not found"}, 404)
+        if SOFT_DELETE:
+            deactivate(planet)
+        else:
+            await session.delete(planet)
+        await publish_event(session, "planet", "deleted", planet.id)
+        await session.commit()
+    return jsonify({"msg": "Planet deleted successfully"}, 200)
+
+
+async def get_characters(request):
+    # the homeworld is loaded up front, lazy loads are not allowed with asyncio
+    async with Session() as session:
+        characters = (
+            await session.scalars(
+                select(Character).options(selectinload(Character.homeworld))
+            )
+        ).all()
+    serialized_characters = list(map(lambda item: item.serialize(), characters))
+    return jsonify({"msg": "ok", "results": serialized_characters}, 200)
+
+
+async def get_single_character(request):
+    async with Session() as session:
+        character = await session.get(
+            Character,
+            request.path_params["character_id"],
+            options=[selectinload(Character.homeworld)],
+        )
+    if character is None:
+        return jsonify({"msg": "Character not found"}, 404)
+    return jsonify({"msg": "ok", "result": character.serialize()}, 200)
+
+
+async def create_character(request):
+    body = await get_body(request)
+    if body is None:
+        return jsonify({"msg": "You must put information in the body"}, 400)
+    if "name" not in body:
+        return jsonify({"msg": "name parameter is required"}, 400)
+    if "homeworld_id" not in body:
+        return jsonify({"msg": "homeworld_id parameter is required"}, 400)
+    if "is_active" not in body:
+        return jsonify({"msg": "is_active parameter is required"}, 400)
+    async with Session() as session:
+        new_character = Character()
+        new_character.name = body["name"]
+        new_character.homeworld_id = body["homeworld_id"]
+        new_character.is_active = body["is_active"]
+        session.add(new_character)
+        await session.flush()
+        await publish_event(session, "character", "created", new_character.id)
+        await session.commit()
+    return jsonify({"msg": "Added successfully"}, 201)
+
+
+async def update_single_character(request):
+    body = await get_body(request)
+    if body is None:
+        return jsonify({"msg": "Character not found"}, 404)
+    if "name" not in body:
+        return jsonify({"msg": "name parameter is required"}, 400)
+    if "homeworld_id" not in body:
+        return jsonify({"msg": "homeworld parameter is required"}, 400)
+    if "is_active" not in body:
+        return jsonify({"msg": "is_active parameter is required"}, 400)
+    async with Session() as session:
+        # inactive rows too, a PUT can undo a soft delete
+        character = await session.get(
+            Character,
+            request.path_params["character_id"],
+            execution_options={"include_inactive": True},
+        )
+        if character is None:
+            return jsonify({"msg": "Character not found"}, 404)
+        character.name = body["name"]
+        character.homeworld_id = body["homeworld_id"]
+        set_active(character, body["is_active"])
+        await publish_event(session, "character", "updated", character.id)
+        await session.commit()
+    return jsonify({"msg": "Updated successfully"}, 200)
+
+
+async def delete_single_character(request):
+    async with Session() as session:
+        character = await session.get(Character, request.path_params["character_id"])
+        if character is None:
+            return jsonify({"msg": "Character not found"}, 404)
+        if SOFT_DELETE:
+            deactivate(character)
+        else:
+            await session.delete(character)
+        await publish_event(session, "character", "deleted", character.id)
+        await session.commit()
+    return jsonify({"msg": "Character deleted successfully"}, 200)
+
+
+async def fetch_user(user_id):
+    async with Session() as session:
+        return await session.get(User, user_id)
+
+
+async def fetch_favorite_planets(user_id):
+    async with Session() as session:
+        return (
+            await session.scalars(
+                select(Planet)
+                .join(Favorite, Favorite.planet_id == Planet.id)
+                .filter(Favorite.user_id == user_id)
+            )
+        ).all()
+
+
+async def fetch_favorite_characters(user_id):
+    async with Session() as session:
+        return (
+            await session.scalars(
+                select(Character)
+                .join(Favorite, Favorite.character_id == Character.id)
+                .filter(Favorite.user_id == user_id)
+                .options(selectinload(Character.homeworld))
+            )
+        ).all()
+
+
+async def get_favorites(request):
+    user_id = request.path_params["user_id"]
+    # the three queries are independent, each one runs on its own session/connection
+    user, favorite_planets, favorite_characters = await asyncio.gather(
+        fetch_user(user_id),
+        fetch_favorite_planets(user_id),
+        fetch_favorite_characters(user_id),
+    )
+    if user is None:
+        return jsonify(
+            {"msg": "The user with id {} doesn't exist".format(user_id)}, 404
+        )
+
+    favorite_planets_serialize = []
+    for planet_item in favorite_planets:
+        favorite_planets_serialize.append({"planet": planet_item.serialize()})
+
+    favorite_characters_serialize = []
+    for character_item in favorite_characters:
+        favorite_characters_serialize.append({"character": character_item.serialize()})
+
+    return jsonify(
+        {
+            "msg": "ok",
+            "user": user.serialize(),
+            "Favorite planets": favorite_planets_serialize,
+            "Favorite characters": favorite_characters_serialize,
+        },
+        200,
+    )
+
+
+async def add_favorite_planet(request):
+    user_id = request.path_params["user_id"]
+    planet_id = request.path_params["planet_id"]
+    async with Session() as session:
+        user = await session.get(User, user_id)
+        planet = await session.get(Planet, planet_id)
+
+        if user is None:
+            return jsonify(
+                {"msg": "The user with id {} doesn't exist".format(user_id)}, 404
+            )
+        if planet is None:
+            return jsonify(
+                {"msg": "The planet with id {} doesn't exist".format(planet_id)}, 404
+            )
+
+        favorite_planets = await session.scalar(
+            select(Favorite).filter(
+                Favorite.user_id == user_id, Favorite.planet_id == planet_id
+            )
+        )
+
+        if favorite_planets:
+            return jsonify({"msg": "It's already on favorites list"}, 409)
+
+        new_favorite = Favorite(user_id=user_id, planet_id=planet_id)
+        session.add(new_favorite)
+        await change_favorite_count(session, Planet, planet_id, 1)
+        await session.flush()
+        await publish_event(session, "favorite", "created", new_favorite.id, user_id)
+        await session.commit()
+
+    return jsonify({"msg": "Favorite planet added successfully"}, 201)
+
+
+async def delete_favorite_planet(request):
+    user_id = request.path_params["user_id"]
+    planet_id = request.path_params["planet_id"]
+    async with Session() as session:
+        favorite = await session.scalar(
+            select(Favorite).filter(
+                Favorite.user_id == user_id, Favorite.planet_id == planet_id
+            )
+        )
+
+        if favorite is None:
+            return jsonify({"msg": "Favorite planet not found"}, 404)
+
+        await session.delete(favorite)
+        await change_favorite_count(session, Planet, planet_id, -1)
+        await publish_event(session, "favorite", "deleted", favorite.id, user_id)
+        await session.commit()
+    return jsonify({"msg": "Favorite planet deleted successfully"}, 200)
+
+
+async def add_favorite_character(request):
+    user_id = request.path_params["user_id"]
+    character_id = request.path_params["character_id"]
+    async with Session() as session:
+        user = await session.get(User, user_id)
+        character = await session.get(Character, character_id)
+
+        if user is None:
+            return jsonify(
+                {"msg": "The user with id {} doesn't exist".format(user_id)}, 404
+            )
+        if character is None:
+            return jsonify(
+                {"msg": "The character with id {} doesn't exist".format(character_id)},
+                404,
+            )
+
+        favorite_character = await session.scalar(
+            select(Favorite).filter(
+                Favorite.user_id == user_id, Favorite.character_id == character_id
+            )
+        )
+
+        if favorite_character:
+            return jsonify({"msg": "It's already on favorites list"}, 409)
+
+        new_favorite = Favorite(user_id=user_id, character_id=character_id)
+        session.add(new_favorite)
+        await change_favorite_count(session, Character, character_id, 1)
+        await session.flush()
+        await publish_event(session, "favorite", "created", new_favorite.id, user_id)
+        await session.commit()
+
+    return jsonify({"msg": "Favorite character added successfully"}, 201)
+
+
+async def delete_favorite_character(request):
+    user_id = request.path_params["user_id"]
+    character_id = request.path_params["character_id"]
+    async with Session() as session:
+        favorite = await session.scalar(
+            select(Favorite).filter(
+                Favorite.user_id == user_id, Favorite.character_id == character_id
+            )
+        )
+
+        if favorite is None:
+            return jsonify({"msg": "Favorite character not found"}, 404)
+
+        await session.delete(favorite)
+        await change_favorite_count(session, Character, character_id, -1)
+        await publish_event(session, "favorite", "deleted", favorite.id, user_id)
+        await session.commit()
+    return jsonify({"msg": "Favorite character deleted successfully"}, 200)
+
+
+async def get_films(request):
+    async with Session() as session:
+        items = (
+            await session.scalars(select(FilmAggregate).order_by(FilmAggregate.film_id))
+        ).all()
+    serialized_films = list(map(lambda item: item.serialize(), items))
+    return jsonify({"msg": "ok", "results": serialized_films}, 200)
+
+
+async def get_single_film(request):
+    async with Session() as session:
+        aggregate = await session.get(FilmAggregate, request.path_params["film_id"])
+    if aggregate is None:
+        return jsonify({"msg": "Film not found"}, 404)
+    return jsonify({"msg": "ok", "result": aggregate.serialize()}, 200)
+
+
+# everything serialize() touches has to be loaded up front, lazy loads are not allowed
+LEADERBOARD_LOADER_OPTIONS = {
+    "planet": [],
+    "character": [selectinload(Character.homeworld)],
+}
+
+
+async def get_leaderboard(request):
+    favorite_type = request.path_params["favorite_type"]
+    if favorite_type not in FAVORITE_COUNTED:
+        return jsonify({"msg": "The type {} doesn't exist".format(favorite_type)}, 404)
+    try:
+        limit = int(request.query_params.get("limit", 10))
+    except ValueError:
+        limit = 10
+    if limit < 1 or limit > 100:
+        return jsonify({"msg": "limit must be between 1 and 100"}, 400)
+    model = FAVORITE_COUNTED[favorite_type][0]
+    if model is Film:
+        # films come from their precomputed documents, see aggregates.py
+        query = (
+            select(FilmAggregate.document, Film.favorite_count)
+            .join(Film, Film.id == FilmAggregate.film_id)
+            .filter(Film.favorite_count > 0)
+            .order_by(Film.favorite_count.desc(), Film.id)
+            .limit(limit)
+        )
+        async with Session() as session:
+            films = (await session.execute(query)).all()
+        serialized_films = list(
+            map(
+                lambda item: dict(item.document, favorite_count=item.favorite_count),
+                films,
+            )
+        )
+        return jsonify({"msg": "ok", "results": serialized_films}, 200)
+    query = (
+        select(model)
+        .filter(model.favorite_count > 0)
+        .order_by(model.favorite_count.desc(), model.id)
+        .limit(limit)
+    )
+    query = query.options(*LEADERBOARD_LOADER_OPTIONS[favorite_type])
+    async with Session() as session:
+        items = (await session.scalars(query)).all()
+        serialized_items = list(
+            map(
+                lambda item: dict(item.serialize(), favorite_count=item.favorite_count),
+                items,
+            )
+        )
+    return jsonify({"msg": "ok", "results": serialized_items}, 200)
+
+
+async def handle_integrity_error(request, error):
+    # a name, user_name or email already used by another active row,
+    # the session was rolled back when its `async with` block exited
+    return jsonify({"msg": "It conflicts with an existing resource"}, 409)
+
+
+async def handle_database_error(request, error):
+    # two writes waited on each other's locks and Postgres cancelled this one,
+    # any other database error is still a 500
+    if not is_retryable_error(error):
+        raise error
+    return JSONResponse(
+        {"msg": "The resource is busy, try again"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+routes = [
+    Route("/", sitemap),
+    Route("/user", get_users, methods=["GET"]),
+    Route("/user", create_user, methods=["POST"]),
+    Route("/user/{user_id:int}", get_single_user, methods=["GET"]),
+    Route("/user/{user_id:int}", update_single_user, methods=["PUT"]),
+    Route("/user/{user_id:int}", delete_single_user, methods=["DELETE"]),
+    Route("/planet", get_planets, methods=["GET"]),
+    Route("/planet", create_planet, methods=["POST"]),
+    Route("/planet/{planet_id:int}", get_single_planet, methods=["GET"]),
+    Route("/planet/{planet_id:int}", update_single_planet, methods=["PUT"]),
+    Route("/planet/{planet_id:int}", delete_single_planet, methods=["DELETE"]),
+    Route("/character", get_characters, methods=["GET"]),
+    Route("/character", create_character, methods=["POST"]),
+    Route("/character/{character_id:int}", get_single_character, methods=["GET"]),
+    Route("/character/{character_id:int}", update_single_character, methods=["PUT"]),
+    Route(
+        "/character/{character_id:int}", delete_single_character, methods=["DELETE"]
+    ),
+    Route("/favorites/user/{user_id:int}", get_favorites, methods=["GET"]),
+    Route(
+        "/favorite/user/{user_id:int}/planet/{planet_id:int}",
+        add_favorite_planet,
+        methods=["POST"],
+    ),
+    Route(
+        "/favorite/user/{user_id:int}/planet/{planet_id:int}",
+        delete_favorite_planet,
+        methods=["DELETE"],
+    ),
+    Route(
+        "/favorite/user/{user_id:int}/character/{character_id:int}",
+        add_favorite_character,
+        methods=["POST"],
+    ),
+    Route(
+        "/favorite/user/{user_id:int}/character/{character_id:int}",
+        delete_favorite_character,
+        methods=["DELETE"],
+    ),
+    Route("/film", get_films, methods=["GET"]),
+    Route("/film/{film_id:int}", get_single_film, methods=["GET"]),
+    Route("/leaderboard/{favorite_type:str}", get_leaderboard, methods=["GET"]),
+]
+
+application = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"])],
+    exception_handlers={
+        IntegrityError: handle_integrity_error,
+        DBAPIError: handle_database_error,
+    },
+    lifespan=lifespan,
+)
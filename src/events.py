@@ -0,0 +1,250 @@
+"""
+Change notifications for the /events Server-Sent Events endpoint.
+The write endpoints call publish_event() right before their commit, the event is
+only sent if the commit succeeds. Each worker keeps the recent events in memory
+(for Last-Event-ID resumes) and one bounded queue per subscriber, so a subscriber
+never holds a database connection.
+With Postgres the events go through NOTIFY, so every worker sees the writes served
+by the others; a single LISTEN connection per worker feeds its subscribers.
+Event ids always grow in the order the events are delivered, a client that resumes
+from an id gets every event after it.
+"""
+import collections
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from sqlalchemy import event as sqlalchemy_event, text
+from sqlalchemy.orm import Session
+from models import db
+
+CHANNEL = "api_events"
+# advisory lock that serializes the event ids with the commits, see publish_event
+ID_LOCK = 31031
+HISTORY_SIZE = int(os.getenv("SSE_HISTORY_SIZE", 1000))
+BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", 100))
+# every open stream keeps one worker thread busy, keep it below GUNICORN_THREADS
+MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", 4))
+KEEPALIVE_SECONDS = 15
+# the listener waits longer between reconnections while the database keeps failing
+MAX_RETRY_SECONDS = 30
+# the event types that belong to a user, ?user_id= only filters these
+USER_SCOPED_TYPES = ("favorite", "user")
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, types=None, user_id=None):
+        self.types = types
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=BUFFER_SIZE)
+        self.overflowed = False
+
+    def matches(self, event):
+        if self.types and event["type"] not in self.types:
+            return False
+        if (
+            self.user_id is not None
+            and event["type"] in USER_SCOPED_TYPES
+            and event["user_id"] != self.user_id
+        ):
+            return False
+        return True
+
+
+class EventBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.history = collections.deque(maxlen=HISTORY_SIZE)
+        self.subscribers = set()
+        self.last_id = 0
+        # events older than this one may be missing from the history
+        self.started_id = time.time_ns() // 1000
+        self.listener = None
+        self.listening = threading.Event()
+        # set while the listener can't LISTEN, the streams would never get an event
+        self.listener_failing = False
+
+    def dispatch(self, event, event_id=None):
+        with self.lock:
+            if event_id is None:
+                # in-process events: time based so the ids keep increasing across
+                # restarts, taken under the same lock as the delivery
+                event_id = max(self.last_id + 1, time.time_ns() // 1000)
+            self.last_id = max(self.last_id, event_id)
+            self.history.append((event_id, event))
+            for subscription in list(self.subscribers):
+                if not subscription.matches(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait((event_id, event))
+                except queue.Full:
+                    # the client is too slow, end its stream so it resumes from history
+                    subscription.overflowed = True
+                    self.subscribers.discard(subscription)
+
+    def subscribe(self, types=None, user_id=None, last_event_id=None):
+        """
+        Returns (subscription, missed events) or (None, None) when the worker
+        already has MAX_CONNECTIONS open streams. `missed` is None when
+        last_event_id is older than the history and the client has to refetch.
+        """
+        subscription = Subscription(types, user_id)
+        with self.lock:
+            if len(self.subscribers) >= MAX_CONNECTIONS:
+                return None, None
+            missed = []
+            if last_event_id is not None:
+                oldest_id = self.started_id
+                if len(self.history) == self.history.maxlen:
+                    oldest_id = self.history[0][0]
+                if last_event_id < oldest_id:
+                    missed = None
+                else:
+                    missed = [
+                        (event_id, event)
+                        for event_id, event in self.history
+                        if event_id > last_event_id and subscription.matches(event)
+                    ]
+            self.subscribers.add(subscription)
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def start_listener(self, engine):
+        """
+        Returns True once the worker is listening, False when it can't LISTEN
+        (the database is down, or the migrations haven't created api_event_id_seq).
+        """
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listening.clear()
+                self.listener_failing = False
+                self.listener = threading.Thread(
+                    target=self.listen, args=(engine,), daemon=True
+                )
+                self.listener.start()
+            elif self.listener_failing:
+                return self.listening.is_set()
+        # the events committed once LISTEN runs are never missed
+        return self.listening.wait(timeout=5)
+
+    def listen(self, engine):
+        retry_seconds = 1
+        while True:
+            try:
+                connection = engine.raw_connection()
+                try:
+                    driver_connection = connection.driver_connection
+                    driver_connection.autocommit = True
+                    cursor = driver_connection.cursor()
+                    cursor.execute("LISTEN {}".format(CHANNEL))
+                    cursor.execute("SELECT last_value, is_called FROM api_event_id_seq")
+                    last_value, is_called = cursor.fetchone()
+                    with self.lock:
+                        # events before LISTEN (or while reconnecting) were not seen
+                        self.history.clear()
+                        self.started_id = last_value if is_called else 0
+                    self.listener_failing = False
+                    retry_seconds = 1
+                    self.listening.set()
+                    while True:
+                        if select.select([driver_connection], [], [], 5) == ([], [], []):
+                            continue
+                        driver_connection.poll()
+                        while driver_connection.notifies:
+                            notify = driver_connection.notifies.pop(0)
+                            event_id, event = json.loads(notify.payload)
+                            self.dispatch(event, event_id)
+                finally:
+                    connection.invalidate()
+            except Exception:
+                # lost the connection to the database, try again in a moment
+                logger.exception(
+                    "The events listener failed, retrying in %s seconds", retry_seconds
+                )
+                self.listening.clear()
+                self.listener_failing = True
+                time.sleep(retry_seconds)
+                retry_seconds = min(retry_seconds * 2, MAX_RETRY_SECONDS)
+
+
+broker = EventBroker()
+
+
+def uses_notify():
+    return db.engine.dialect.name == "postgresql"
+
+
+# NOTIFY is transactional. The advisory lock is held until the commit, so the ids
+# from the sequence are handed out in commit order, the order in which every
+# listener receives the notifications
+NOTIFY_EVENT = text(
+    "WITH id_lock AS (SELECT pg_advisory_xact_lock(:lock)) "
+    "SELECT pg_notify(:channel, json_build_array("
+    "nextval('api_event_id_seq'), CAST(:event AS json))::text) "
+    "FROM id_lock"
+)
+
+
+def build_event(resource, action, item_id, user_id=None):
+    return {"type": resource, "action": action, "id": item_id, "user_id": user_id}
+
+
+def notify_parameters(event):
+    return {"lock": ID_LOCK, "channel": CHANNEL, "event": json.dumps(event)}
+
+
+def publish_event(resource, action, item_id, user_id=None):
+    # call it before db.session.commit(), the event goes out with the commit
+    event = build_event(resource, action, item_id, user_id)
+    if uses_notify():
+        # the pending changes are flushed first: every write takes its row locks
+        # before the advisory lock, two writes can't wait on each other's locks
+        db.session.flush()
+        db.session.execute(NOTIFY_EVENT, notify_parameters(event))
+    else:
+        db.session.info.setdefault("events", []).append(event)
+
+
+@sqlalchemy_event.listens_for(Session, "after_commit")
+def dispatch_events(session):
+    for event in session.info.pop("events", []):
+        broker.dispatch(event)
+
+
+@sqlalchemy_event.listens_for(Session, "after_rollback")
+def forget_events(session):
+    session.info.pop("events", None)
+
+
+def format_event(event_id, event):
+    return "id: {}\nevent: {}\ndata: {}\n\n".format(
+        event_id, event["type"], json.dumps(event)
+    )
+
+
+def stream_events(subscription, missed):
+    try:
+        # a short reconnection delay for EventSource clients
+        yield "retry: 3000\n\n"
+        if missed is None:
+            yield "event: reset\ndata: {}\n\n"
+        else:
+            for event_id, event in missed:
+                yield format_event(event_id, event)
+        while not subscription.overflowed:
+            try:
+                event_id, event = subscription.queue.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event_id, event)
+    finally:
+        broker.unsubscribe(subscription)
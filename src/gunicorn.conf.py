@@ -0,0 +1,31 @@
+# Gunicorn settings used by the Procfile and render.yaml.
+# Read more about them here: https://docs.gunicorn.org/en/stable/settings.html
+import multiprocessing
+import os
+
+bind = "0.0.0.0:{}".format(os.environ.get("PORT", 3000))
+
+# WEB_CONCURRENCY is the variable Render and Heroku use to size the web process
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+# every open /events stream takes one thread, see SSE_MAX_CONNECTIONS
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# import the app once in the master so the workers share its memory (copy-on-write)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def post_fork(server, worker):
+    # the forked worker must not reuse the sockets of the master's pool,
+    # drop them without closing so the master's connections stay untouched
+    if not server.cfg.preload_app:
+        return
+    from models import db
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
@@ -3,13 +3,45 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 
+def soft_delete_indexes(table_name, *unique_columns):
+    # partial indexes: listing active rows and purging old inactive ones stay cheap.
+    # unique_columns are only unique among the active rows, so a soft-deleted row
+    # doesn't block creating its replacement
+    indexes = (
+        db.Index(
+            "ix_{}_active".format(table_name),
+            "id",
+            postgresql_where=db.text("is_active"),
+            sqlite_where=db.text("is_active"),
+        ),
+        db.Index(
+            "ix_{}_inactive_deleted_at".format(table_name),
+            "deleted_at",
+            postgresql_where=db.text("NOT is_active"),
+            sqlite_where=db.text("NOT is_active"),
+        ),
+    )
+    return indexes + tuple(
+        db.Index(
+            "uq_{}_{}_active".format(table_name, column),
+            column,
+            unique=True,
+            postgresql_where=db.text("is_active"),
+            sqlite_where=db.text("is_active"),
+        )
+        for column in unique_columns
+    )
+
+
 class User(db.Model):
     __tablename__ = "user"
     id = db.Column(db.Integer, primary_key=True)
-    user_name = db.Column(db.String(50), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    user_name = db.Column(db.String(50), nullable=False, index=True)
+    email = db.Column(db.String(120), nullable=False, index=True)
     password = db.Column(db.String(80), unique=False, nullable=False)
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    deleted_at = db.Column(db.DateTime)
+    __table_args__ = soft_delete_indexes("user", "user_name", "email")
 
     def __repr__(self):
         return "{}".format(self.user_name)
@@ -26,11 +58,16 @@ class User(db.Model):
 class Planet(db.Model):
     __tablename__ = "planet"
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False, index=True)
     population = db.Column(db.Integer)
     terrain = db.Column(db.String(80))
     climate = db.Column(db.String(80))
+    favorite_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    deleted_at = db.Column(db.DateTime)
+    __table_args__ = soft_delete_indexes("planet", "name")
 
     def __repr__(self):
         return "{}".format(self.name)
@@ -49,13 +86,20 @@ class Planet(db.Model):
 class Character(db.Model):
     __tablename__ = "character"
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False, index=True)
     height = db.Column(db.Float)
     mass = db.Column(db.Float)
     birth_year = db.Column(db.String(50))
-    homeworld_id = db.Column(db.Integer, db.ForeignKey("planet.id"), nullable=False)
+    homeworld_id = db.Column(
+        db.Integer, db.ForeignKey("planet.id"), nullable=False, index=True
+    )
     homeworld = db.relationship("Planet")
+    favorite_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    deleted_at = db.Column(db.DateTime)
+    __table_args__ = soft_delete_indexes("character", "name")
 
     def __repr__(self):
         return "{}".format(self.name)
@@ -75,12 +119,14 @@ class Character(db.Model):
 class Starship(db.Model):
     __tablename__ = "starship"
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False, index=True)
     model = db.Column(db.String(64))
     starship_type = db.Column(db.String(64))
     pilot_id = db.Column(db.Integer, db.ForeignKey("character.id"))
     pilot = db.relationship("Character")
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    deleted_at = db.Column(db.DateTime)
+    __table_args__ = soft_delete_indexes("starship", "name")
 
     def __repr__(self):
         return "{}".format(self.name)
@@ -99,7 +145,7 @@ class Starship(db.Model):
 class Vehicle(db.Model):
     __tablename__ = "vehicle"
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80), unique=True, nullable=False)
+    name = db.Column(db.String(80), nullable=False, index=True)
     model = db.Column(db.String(64))
     vehicle_type = db.Column(
         db.Enum("Squad transport", "Speeder bike", name="vehicle_types")
@@ -107,6 +153,8 @@ class Vehicle(db.Model):
     pilot_id = db.Column(db.Integer, db.ForeignKey("character.id"))
     pilot = db.relationship("Character")
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    deleted_at = db.Column(db.DateTime)
+    __table_args__ = soft_delete_indexes("vehicle", "name")
 
     def __repr__(self):
         return "{}".format(self.name)
@@ -116,7 +164,7 @@ class Vehicle(db.Model):
             "id": self.id,
             "name": self.name,
             "model": self.model,
-            "vehicle_type": self.vehicle_type.value,
+            "vehicle_type": self.vehicle_type,
             "pilot": self.pilot.serialize() if self.pilot else None,
             "is_active": self.is_active,
         }
@@ -153,7 +201,12 @@ class Film(db.Model):
     title = db.Column(db.String())
     film_data_id = db.Column(db.Integer, db.ForeignKey("film_data.id"))
     film_data = db.relationship("FilmData")
+    favorite_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    deleted_at = db.Column(db.DateTime)
+    __table_args__ = soft_delete_indexes("film")
 
     def __repr__(self):
         return "{}".format(self.title)
@@ -167,14 +220,33 @@ class Film(db.Model):
         }
 
 
+class FilmAggregate(db.Model):
+    # Film.serialize() precomputed, kept up to date by aggregates.py
+    __tablename__ = "film_aggregate"
+    film_id = db.Column(
+        db.Integer, db.ForeignKey("film.id", ondelete="CASCADE"), primary_key=True
+    )
+    document = db.Column(db.JSON, nullable=False)
+
+    def __repr__(self):
+        return "Agregado de pelicula {}".format(self.film_id)
+
+    def serialize(self):
+        return self.document
+
+
 class Favorite(db.Model):
     __tablename__ = "favorite"
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     user = db.relationship("User")
-    character_id = db.Column(db.Integer, db.ForeignKey("character.id"), nullable=True)
+    character_id = db.Column(
+        db.Integer, db.ForeignKey("character.id"), nullable=True, index=True
+    )
     character = db.relationship("Character")
-    planet_id = db.Column(db.Integer, db.ForeignKey("planet.id"), nullable=True)
+    planet_id = db.Column(
+        db.Integer, db.ForeignKey("planet.id"), nullable=True, index=True
+    )
     planet = db.relationship("Planet")
     starship_id = db.Column(db.Integer, db.ForeignKey("starship.id"), nullable=True)
     starship = db.relationship("Starship")
@@ -224,3 +296,37 @@ class Favorite(db.Model):
             or self.vehicle_id
             or self.film_id,
         }
+
+
+# ids of the /events notifications when they go through Postgres NOTIFY,
+# see events.publish_event
+event_id_sequence = db.Sequence("api_event_id_seq", metadata=db.metadata)
+
+
+# models with a denormalized favorite_count and the Favorite column pointing to them
+FAVORITE_COUNTED = {
+    "planet": (Planet, Favorite.planet_id),
+    "character": (Character, Favorite.character_id),
+    "film": (Film, Favorite.film_id),
+}
+
+
+def change_favorite_count(model, item_id, amount):
+    # a single UPDATE so concurrent requests can't lose increments,
+    # it is committed together with the Favorite row
+    db.session.query(model).filter(model.id == item_id).update(
+        {model.favorite_count: model.favorite_count + amount},
+        synchronize_session=False,
+    )
+
+
+def recompute_favorite_counts():
+    # one bulk UPDATE per table, to repair counters that drifted
+    for model, favorite_column in FAVORITE_COUNTED.values():
+        count = (
+            db.select(db.func.count(Favorite.id))
+            .where(favorite_column == model.id)
+            .scalar_subquery()
+        )
+        db.session.execute(db.update(model).values(favorite_count=count))
+    db.session.commit()
@@ -0,0 +1,139 @@
+"""
+Soft-delete mode, enabled with SOFT_DELETE=true.
+DELETE endpoints set is_active to false (and deleted_at) instead of removing the row,
+and every ORM SELECT leaves the inactive rows out unless it is executed with
+execution_options(include_inactive=True), like the admin views and the PUT
+endpoints do, so a PUT with is_active=true brings a row back.
+purge_inactive() hard-deletes the rows that have been inactive for a while, in batches.
+"""
+import datetime
+import os
+from sqlalchemy import event, exists
+from sqlalchemy.orm import Session, with_loader_criteria
+from models import (
+    db,
+    User,
+    Planet,
+    Character,
+    Starship,
+    Vehicle,
+    FilmData,
+    Film,
+    Favorite,
+    recompute_favorite_counts,
+)
+from aggregates import TRACKED_MODELS, find_affected_films, refresh_film_aggregates
+
+SOFT_DELETE = os.getenv("SOFT_DELETE", "false").lower() == "true"
+
+# purge order: rows that reference others go first
+SOFT_DELETE_MODELS = (User, Film, Vehicle, Starship, Character, Planet)
+
+# columns that point to each model and have to be cleared before a purge
+FAVORITE_COLUMNS = {
+    User: Favorite.user_id,
+    Film: Favorite.film_id,
+    Vehicle: Favorite.vehicle_id,
+    Starship: Favorite.starship_id,
+    Character: Favorite.character_id,
+    Planet: Favorite.planet_id,
+}
+NULLABLE_REFERENCES = {
+    Vehicle: [FilmData.vehicle_id],
+    Starship: [FilmData.starship_id],
+    Character: [FilmData.character_id, Starship.pilot_id, Vehicle.pilot_id],
+    Planet: [FilmData.planet_id],
+}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def filter_inactive(execute_state):
+    if not SOFT_DELETE or not execute_state.is_select:
+        return
+    if execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.execution_options.get("include_inactive", False):
+        return
+    # only the queried entities are filtered, eager and lazy loaded relationships
+    # are not: a character still shows its homeworld
+    entities = set(
+        description["entity"]
+        for description in execute_state.statement.column_descriptions
+        if description.get("entity") is not None
+    )
+    execute_state.statement = execute_state.statement.options(
+        *[
+            with_loader_criteria(
+                model,
+                lambda cls: cls.is_active,
+                include_aliases=True,
+                propagate_to_loaders=False,
+            )
+            for model in SOFT_DELETE_MODELS
+            if model in entities
+        ]
+    )
+
+
+def deactivate(item):
+    item.is_active = False
+    item.deleted_at = datetime.datetime.utcnow()
+
+
+def set_active(item, is_active):
+    # with SOFT_DELETE a PUT with is_active=false is a soft delete,
+    # and is_active=true undoes one
+    if SOFT_DELETE and item.is_active and not is_active:
+        deactivate(item)
+        return
+    item.is_active = is_active
+    if is_active:
+        item.deleted_at = None
+
+
+def delete_item(item):
+    if SOFT_DELETE:
+        deactivate(item)
+    else:
+        db.session.delete(item)
+
+
+def purge_inactive(days=30, batch_size=500):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    purged = {}
+    for model in SOFT_DELETE_MODELS:
+        purged[model.__tablename__] = 0
+        query = (
+            db.select(model.id)
+            .where(model.is_active.is_(False), model.deleted_at < cutoff)
+            .limit(batch_size)
+            .execution_options(include_inactive=True)
+        )
+        if model is Planet:
+            # a planet can't go while a character still lives on it
+            query = query.where(~exists().where(Character.homeworld_id == Planet.id))
+        while True:
+            ids = db.session.scalars(query).all()
+            if not ids:
+                break
+            changed = dict((tracked, set()) for tracked in TRACKED_MODELS)
+            if model in changed:
+                changed[model].update(ids)
+            film_ids = find_affected_films(db.session, changed)
+
+            db.session.execute(
+                db.delete(Favorite).where(FAVORITE_COLUMNS[model].in_(ids))
+            )
+            for column in NULLABLE_REFERENCES.get(model, []):
+                db.session.execute(
+                    db.update(column.class_).where(column.in_(ids)).values({column: None})
+                )
+            db.session.execute(db.delete(model).where(model.id.in_(ids)))
+            if film_ids:
+                refresh_film_aggregates(db.session, film_ids)
+            db.session.commit()
+            purged[model.__tablename__] += len(ids)
+    if any(purged.values()):
+        # the favorites removed along with the rows were still counted
+        recompute_favorite_counts()
+    return purged
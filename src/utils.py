@@ -1,3 +1,4 @@
+import os
 from flask import jsonify, url_for
 
 class APIException(Exception):
@@ -15,6 +16,31 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+# Postgres cancelled the transaction to break a deadlock (or a serialization
+# failure), the same request succeeds when it is sent again
+RETRYABLE_SQLSTATES = ("40P01", "40001")
+
+def is_retryable_error(error):
+    return getattr(error.orig, "pgcode", None) in RETRYABLE_SQLSTATES
+
+def get_database_url():
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        return db_url.replace("postgres://", "postgresql://")
+    return "sqlite:////tmp/test.db"
+
+def get_engine_options():
+    # production profile: tune the connection pool from the environment
+    if os.getenv("APP_MODE") != "production":
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()